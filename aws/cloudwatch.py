@@ -1,13 +1,53 @@
+import re
+import math
+import array
 import decimal
 import datetime
+import concurrent.futures
 import botocore.exceptions
-from typing import List, Any, Union, Dict
+from typing import List, Any, Union, Dict, Optional, Tuple
 
 from .service import AWSService
 from . import exceptions
 
 from boto3 import client
 
+# NumPy is optional. Without it metric series are returned as array.array('d')
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# get_metric_data() accepts at most 500 MetricDataQueries per call
+GET_METRIC_DATA_MAX_QUERIES = 500
+
+
+class MetricSeries:
+    """
+    Datapoints of a single metric data query returned by CloudWatch.get_metrics()
+    Timestamps (epoch seconds) and values are stored as float64 numpy arrays when NumPy is installed,
+    array.array('d') otherwise, and are ordered by timestamp ascending
+    """
+
+    def __init__(self,
+                 query_id: str,
+                 label: str,
+                 timestamps: Union[array.array, Any],
+                 values: Union[array.array, Any],
+                 status_code: str):
+        self.query_id: str = query_id
+        self.label: str = label
+        self.timestamps = timestamps
+        self.values = values
+        self.status_code: str = status_code
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __repr__(self) -> str:
+        return f"MetricSeries(query_id={self.query_id!r}, label={self.label!r}, " \
+               f"datapoints={len(self)}, status_code={self.status_code!r})"
+
 
 class CloudWatch(AWSService):
 
@@ -48,6 +88,281 @@ class CloudWatch(AWSService):
 
         return response
 
+    def get_metrics(self,
+                    metric_queries: List[Dict[str, Any]],
+                    start_time: datetime.datetime,
+                    end_time: datetime.datetime,
+                    window: Optional[datetime.timedelta] = None,
+                    max_workers: int = 10) -> Dict[str, MetricSeries]:
+        """
+        Retrieve many metric series at once
+        https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudwatch.html#CloudWatch.Client.get_metric_data
+        Queries are packed into batches of up to 500 per GetMetricData call and the time range is optionally split
+        into windows. Every batch/window pair is fetched concurrently, each following its own NextToken pages.
+        Expression queries are kept in the same batch as every query they reference, directly or indirectly.
+        A group of queries referencing each other can't be larger than 500 queries. Expressions using METRICS()
+        refer to every query in their request, so they are only supported with at most 500 queries in total.
+        :param metric_queries: MetricDataQueries. Can be passed normally or by using construct_metric_query() helper func
+        ex: queries = [construct_metric_query(query_id="cpu_i1234",
+                                              name_space="AWS/EC2",
+                                              metric_name="CPUUtilization",
+                                              dimensions=[{"Name": "InstanceId", "Value": "i-1234"}],
+                                              period=60,
+                                              stat="Average")]
+        :param start_time: Start of the time range, inclusive
+        :param end_time: End of the time range, exclusive
+        :param window: Split the time range into windows of this length and fetch them in parallel.
+                       Must be a multiple of every query period. start_time is rounded down to a multiple of every
+                       query period so windows line up with datapoints. Datapoints repeated by a window, since
+                       CloudWatch also rounds StartTime down for older data, are dropped. Not supported with expression queries since
+                       functions like RATE, DIFF or FILL depend on datapoints from the previous window.
+                       None fetches the whole range in one window
+        :param max_workers: Maximum number of concurrent GetMetricData calls
+        :return: Mapping of query Id to its MetricSeries. Queries with ReturnData set to False are not included
+        """
+
+        query_ids = [query.get("Id") for query in metric_queries]
+        if len(set(query_ids)) != len(query_ids):
+            raise exceptions.ClientError(error_message=f"Metric query Ids must be unique: {query_ids}")
+
+        windows = self._split_time_range(metric_queries=metric_queries,
+                                         start_time=start_time,
+                                         end_time=end_time,
+                                         window=window)
+        batches = self._batch_metric_queries(metric_queries=metric_queries)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [[executor.submit(self._get_metric_data_pages, batch, window_start, window_end)
+                        for window_start, window_end in windows]
+                       for batch in batches]
+
+            series: Dict[str, MetricSeries] = dict()
+            for batch_futures in futures:
+                # Windows are in chronological order so concatenating them keeps timestamps ascending
+                for future in batch_futures:
+                    for query_id, (label, timestamps, values, status_code) in future.result().items():
+                        merged = series.get(query_id)
+                        if merged is None:
+                            series[query_id] = MetricSeries(query_id=query_id,
+                                                            label=label,
+                                                            timestamps=timestamps,
+                                                            values=values,
+                                                            status_code=status_code)
+                            continue
+
+                        # CloudWatch rounds StartTime down (by period, and to 5 minutes or 1 hour for older data)
+                        # so a window can repeat datapoints already returned by the previous window
+                        skip = 0
+                        if len(merged.timestamps):
+                            last_timestamp = merged.timestamps[-1]
+                            while skip < len(timestamps) and timestamps[skip] <= last_timestamp:
+                                skip += 1
+
+                        merged.timestamps.extend(timestamps[skip:])
+                        merged.values.extend(values[skip:])
+                        merged.label = merged.label or label
+                        if merged.status_code == "Complete":
+                            merged.status_code = status_code
+
+        if numpy is not None:
+            for merged in series.values():
+                merged.timestamps = numpy.frombuffer(merged.timestamps, dtype=numpy.float64)
+                merged.values = numpy.frombuffer(merged.values, dtype=numpy.float64)
+
+        return series
+
+    def _get_metric_data_pages(self,
+                               metric_queries: List[Dict[str, Any]],
+                               start_time: datetime.datetime,
+                               end_time: datetime.datetime) -> Dict[str, Tuple[str, array.array, array.array, str]]:
+        """
+        Runs a single GetMetricData query and follows NextToken until every page is retrieved
+        :return: Mapping of query Id to (label, timestamps, values, status code)
+        """
+
+        query = {
+            "MetricDataQueries": metric_queries,
+            "StartTime": start_time,
+            "EndTime": end_time,
+            "ScanBy": "TimestampAscending"
+        }
+
+        results: Dict[str, Tuple[str, array.array, array.array, str]] = dict()
+
+        try:
+            while True:
+                response = self._cw.get_metric_data(**query)
+
+                for result in response['MetricDataResults']:
+                    query_id: str = result['Id']
+                    if query_id not in results:
+                        results[query_id] = (result.get('Label', ""), array.array('d'), array.array('d'), "Complete")
+
+                    label, timestamps, values, status_code = results[query_id]
+                    timestamps.extend(ts.timestamp() for ts in result['Timestamps'])
+                    values.extend(result['Values'])
+
+                    # A page other than the last reports PartialData, keep only real failures
+                    if result.get('StatusCode') not in ("Complete", "PartialData"):
+                        results[query_id] = (label, timestamps, values, result.get('StatusCode'))
+
+                next_token = response.get('NextToken')
+                if not next_token:
+                    break
+                query["NextToken"] = next_token
+
+        except botocore.exceptions.ClientError as boto_err:
+            raise exceptions.ClientError(exception=boto_err)
+        except (botocore.exceptions.NoCredentialsError,
+                botocore.exceptions.ParamValidationError) as boto_err:
+            raise exceptions.ClientError(exception=boto_err)
+        except KeyError as err:
+            raise exceptions.ClientError(f"Error retrieving metric data from response object {err}")
+
+        return results
+
+    @staticmethod
+    def _batch_metric_queries(metric_queries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """
+        Packs queries into batches of up to 500, keeping each expression in the same batch as the queries it references
+        Raises ClientError if more than one batch is needed and an expression uses METRICS()
+        """
+        query_ids = {query.get("Id") for query in metric_queries}
+
+        # Union-find over query Ids, every expression is joined with the Ids it references
+        groups: Dict[str, str] = {query_id: query_id for query_id in query_ids}
+
+        def find(query_id: str) -> str:
+            while groups[query_id] != query_id:
+                groups[query_id] = groups[groups[query_id]]
+                query_id = groups[query_id]
+            return query_id
+
+        for query in metric_queries:
+            for token in re.findall(r"[A-Za-z_][A-Za-z0-9_]*", query.get("Expression", "")):
+                if token in query_ids:
+                    groups[find(token)] = find(query.get("Id"))
+
+        # Keep queries in their original order within each group and groups in order of first appearance
+        grouped: Dict[str, List[Dict[str, Any]]] = dict()
+        for query in metric_queries:
+            grouped.setdefault(find(query.get("Id")), list()).append(query)
+
+        batches: List[List[Dict[str, Any]]] = list()
+        for group in grouped.values():
+            if len(group) > GET_METRIC_DATA_MAX_QUERIES:
+                raise exceptions.ClientError(error_message=f"{len(group)} metric queries reference each other, "
+                                                           f"at most {GET_METRIC_DATA_MAX_QUERIES} can be retrieved "
+                                                           f"in one GetMetricData call")
+            if not batches or len(batches[-1]) + len(group) > GET_METRIC_DATA_MAX_QUERIES:
+                batches.append(list())
+            batches[-1].extend(group)
+
+        # METRICS() and METRICS('label') refer to every query in the same GetMetricData call
+        if len(batches) > 1 and any(re.search(r"\bMETRICS\s*\(", query.get("Expression", ""))
+                                    for query in metric_queries):
+            raise exceptions.ClientError(error_message=f"Expressions using METRICS() need every query in one "
+                                                       f"GetMetricData call, at most {GET_METRIC_DATA_MAX_QUERIES} "
+                                                       f"queries are supported")
+
+        return batches
+
+    @staticmethod
+    def _split_time_range(metric_queries: List[Dict[str, Any]],
+                          start_time: datetime.datetime,
+                          end_time: datetime.datetime,
+                          window: Optional[datetime.timedelta]) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """
+        Splits [start_time, end_time) into consecutive windows of the passed length. The last window may be shorter
+        """
+        if start_time >= end_time:
+            raise exceptions.ClientError(error_message=f"start_time {start_time} must be before end_time {end_time}")
+
+        if window is None:
+            return [(start_time, end_time)]
+
+        if any("Expression" in query for query in metric_queries):
+            raise exceptions.ClientError(error_message="Splitting the time range into windows is not supported with "
+                                                       "expression queries")
+
+        window_seconds = window.total_seconds()
+        if window_seconds <= 0:
+            raise exceptions.ClientError(error_message=f"Window of {window} must be positive")
+
+        # Windows not aligned to the period would split a period's datapoint across two requests
+        alignment = 1
+        for query in metric_queries:
+            period = query.get("MetricStat", {}).get("Period")
+            if period and window_seconds % period:
+                raise exceptions.ClientError(error_message=f"Window of {window} is not a multiple of the "
+                                                           f"{period} second period of query {query.get('Id')}")
+            if period:
+                alignment = alignment * period // math.gcd(alignment, period)
+
+        # CloudWatch rounds every StartTime down to the period, align the first window so no datapoint is returned
+        # by two windows. Naive datetimes are treated as UTC like botocore does
+        if start_time.tzinfo is None:
+            epoch = datetime.datetime(1970, 1, 1)
+        else:
+            epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+        offset = (start_time - epoch).total_seconds() % alignment
+        start_time = start_time - datetime.timedelta(seconds=offset)
+
+        windows: List[Tuple[datetime.datetime, datetime.datetime]] = list()
+        window_start = start_time
+        while window_start < end_time:
+            window_end = min(window_start + window, end_time)
+            windows.append((window_start, window_end))
+            window_start = window_end
+
+        return windows
+
+    @staticmethod
+    def construct_metric_query(query_id: str,
+                               name_space: str,
+                               metric_name: str,
+                               dimensions: List[Dict[str, str]],
+                               period: int,
+                               stat: str,
+                               unit: Optional[str] = None,
+                               label: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Constructs a metric data query to be used to retrieve metrics from CloudWatch
+        :param query_id: Unique Id of the query. Must start with a lowercase letter, e.g. cpu_i1234
+        :param name_space:
+        :param metric_name:
+        :param dimensions:
+        :param period: Granularity of the returned datapoints in seconds
+        :param stat: Statistic to return, e.g. Average, Sum, p99
+        :param unit:
+        :param label:
+        :return: Mapping of metric data query to be used with get_metrics()
+        """
+
+        metric_stat = {
+            "Metric": {
+                "Namespace": name_space,
+                "MetricName": metric_name,
+                "Dimensions": dimensions
+            },
+            "Period": period,
+            "Stat": stat
+        }
+
+        if unit is not None:
+            metric_stat = {**metric_stat, "Unit": unit}
+
+        metric_query = {
+            "Id": query_id,
+            "MetricStat": metric_stat,
+            "ReturnData": True
+        }
+
+        if label is not None:
+            metric_query = {**metric_query, "Label": label}
+
+        return metric_query
+
     @staticmethod
     def construct_metric_data(metric_name: str,
                               value: Union[float, decimal.Decimal, int],
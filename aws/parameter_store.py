@@ -53,6 +53,9 @@ class ParameterStore(AWSService):
         except botocore.exceptions.NoCredentialsError as boto_err:
             # Custom no credentials found error if desired
             raise exceptions.ClientError(exception=boto_err)
+        except botocore.exceptions.BotoCoreError as boto_err:
+            # Connection errors, read timeouts, etc.
+            raise exceptions.ClientError(exception=boto_err)
 
         return self._get_mapping_from_response(response=response)
 
@@ -92,6 +95,47 @@ class ParameterStore(AWSService):
 
         return structured_params
 
+    def retrieve_param_versions_by_path(self,
+                                        param_path: str,
+                                        recursive: bool) -> Dict[str, int]:
+        """
+        Retrieve the current version of every param that exists in the passed path without fetching any values.
+        Uses describe_parameters() which only returns metadata, so this is cheap to poll and never decrypts
+        SecureString values. Compare the result against previously seen versions to find params that changed.
+        Example: With passed path as /foo/bar/
+                 returns {"/foo/bar/secret1": 3, "/foo/bar/secret2": 1}
+        :param param_path: Path to look up params in
+        :param recursive: Include params in nested paths
+        :return: Mapping of full parameter name to its current version
+        """
+
+        query = {
+            "ParameterFilters": [
+                {
+                    "Key": "Path",
+                    "Option": "Recursive" if recursive else "OneLevel",
+                    "Values": [param_path]
+                }
+            ]
+        }
+
+        versions: Dict[str, int] = dict()
+
+        try:
+            paginator = self._ssm.get_paginator('describe_parameters')
+            # 50 is the largest page size describe_parameters() allows
+            for page in paginator.paginate(**query, PaginationConfig={"PageSize": 50}):
+                for metadata in page['Parameters']:
+                    versions[metadata['Name']] = metadata['Version']
+        except (botocore.exceptions.ClientError,
+                botocore.exceptions.BotoCoreError) as boto_err:
+            raise exceptions.ClientError(error_message=f"Error when describing parameters in {param_path}:",
+                                         exception=boto_err)
+        except KeyError as err:
+            raise exceptions.ClientError(f"Error retrieving parameter version from response object {err}")
+
+        return versions
+
     def _get_mapping_from_response(self, response: Dict[str, Any]) -> Dict[str, str]:
         """
         Receives an AWS get_parameters(), get_parameters_by_path() or paginator('get_parameters_by_path') response,
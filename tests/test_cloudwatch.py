@@ -0,0 +1,191 @@
+import array
+import datetime
+import unittest
+from typing import Any, Dict, List
+from unittest import mock
+
+import sajlib.aws.cloudwatch
+import sajlib.aws.exceptions
+from sajlib.aws.cloudwatch import CloudWatch
+
+START = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class FakeCloudWatchClient:
+    """
+    Stands in for the boto3 cloudwatch client. Returns one datapoint per period, value being minutes since START,
+    rounding StartTime down to the period like CloudWatch does, split over pages of at most page_size datapoints.
+    start_rounding rounds StartTime down further like CloudWatch does for older data, e.g. 3600 after 63 days
+    """
+
+    def __init__(self, page_size: int = 1000, status_codes: Dict[datetime.datetime, str] = None):
+        self.page_size = page_size
+        self.start_rounding = 0
+        self.status_codes = status_codes or dict()
+        self.calls: List[Dict[str, Any]] = list()
+
+    def get_metric_data(self, **query: Any) -> Dict[str, Any]:
+        self.calls.append(query)
+        offset = int(query.get("NextToken", 0))
+        results = list()
+
+        for metric_query in query["MetricDataQueries"]:
+            if not metric_query.get("ReturnData", True):
+                continue
+            period = metric_query.get("MetricStat", {}).get("Period", 60)
+            start = query["StartTime"] - datetime.timedelta(
+                seconds=(query["StartTime"] - START).total_seconds() % max(period, self.start_rounding))
+            timestamps = list()
+            while start < query["EndTime"]:
+                timestamps.append(start)
+                start += datetime.timedelta(seconds=period)
+
+            page = timestamps[offset:offset + self.page_size]
+            last_page = offset + self.page_size >= len(timestamps)
+            results.append({
+                "Id": metric_query["Id"],
+                "Label": metric_query["Id"],
+                "Timestamps": page,
+                "Values": [(ts - START).total_seconds() / 60 for ts in page],
+                "StatusCode": self.status_codes.get(query["StartTime"], "Complete" if last_page else "PartialData")
+            })
+
+        response = {"MetricDataResults": results}
+        if any(result["StatusCode"] == "PartialData" for result in results):
+            response["NextToken"] = str(offset + self.page_size)
+        return response
+
+
+class TestCloudWatchGetMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.cw = CloudWatch(region_name="us-east-1")
+        self.fake = FakeCloudWatchClient()
+        self.cw._cw = self.fake
+
+    @staticmethod
+    def _query(query_id: str, period: int = 60) -> Dict[str, Any]:
+        return CloudWatch.construct_metric_query(query_id=query_id,
+                                                 name_space="AWS/EC2",
+                                                 metric_name="CPUUtilization",
+                                                 dimensions=[{"Name": "InstanceId", "Value": query_id}],
+                                                 period=period,
+                                                 stat="Average")
+
+    def test_follows_next_token(self):
+        self.fake.page_size = 25
+
+        series = self.cw.get_metrics([self._query("cpu")], START, START + datetime.timedelta(hours=1))["cpu"]
+
+        self.assertEqual(len(self.fake.calls), 3)
+        self.assertNotIn("NextToken", self.fake.calls[0])
+        self.assertEqual([call["NextToken"] for call in self.fake.calls[1:]], ["25", "50"])
+        self.assertEqual(list(series.values), [float(minute) for minute in range(60)])
+        self.assertEqual(series.status_code, "Complete")
+
+    def test_windows_are_aligned_and_merged_in_order(self):
+        # Starting mid-period must not return the datapoint at 00:05 from two windows
+        start = START + datetime.timedelta(seconds=30)
+
+        series = self.cw.get_metrics([self._query("cpu", period=300)],
+                                     start,
+                                     START + datetime.timedelta(hours=3),
+                                     window=datetime.timedelta(hours=1),
+                                     max_workers=3)["cpu"]
+
+        self.assertEqual(len(self.fake.calls), 3)
+        self.assertEqual(self.fake.calls[0]["StartTime"], START)
+        timestamps = list(series.timestamps)
+        self.assertEqual(timestamps, sorted(set(timestamps)))
+        self.assertEqual(list(series.values), [float(minute) for minute in range(0, 180, 5)])
+
+    def test_windows_rounded_to_the_hour_are_not_repeated(self):
+        self.fake.start_rounding = 3600
+        start = START + datetime.timedelta(minutes=30)
+
+        series = self.cw.get_metrics([self._query("cpu")],
+                                     start,
+                                     START + datetime.timedelta(hours=3),
+                                     window=datetime.timedelta(hours=1))["cpu"]
+
+        # The first window is rounded back to 00:00, every later window repeats the half hour before it
+        timestamps = list(series.timestamps)
+        self.assertEqual(timestamps, sorted(set(timestamps)))
+        self.assertEqual(list(series.values), [float(minute) for minute in range(0, 180)])
+
+    def test_window_must_be_multiple_of_period(self):
+        with self.assertRaises(sajlib.aws.exceptions.ClientError):
+            self.cw.get_metrics([self._query("cpu", period=300)],
+                                START,
+                                START + datetime.timedelta(hours=1),
+                                window=datetime.timedelta(seconds=420))
+
+    def test_windows_rejected_with_expressions(self):
+        queries = [self._query("cpu"), {"Id": "rate", "Expression": "RATE(cpu)"}]
+
+        with self.assertRaises(sajlib.aws.exceptions.ClientError):
+            self.cw.get_metrics(queries, START, START + datetime.timedelta(hours=2), window=datetime.timedelta(hours=1))
+
+    def test_non_complete_status_is_kept(self):
+        self.fake.status_codes = {START + datetime.timedelta(hours=1): "InternalError"}
+
+        series = self.cw.get_metrics([self._query("cpu")],
+                                     START,
+                                     START + datetime.timedelta(hours=3),
+                                     window=datetime.timedelta(hours=1))["cpu"]
+
+        self.assertEqual(series.status_code, "InternalError")
+        self.assertEqual(len(series), 180)
+
+    def test_expression_batched_with_referenced_queries(self):
+        queries = [self._query(f"m{i}") for i in range(600)]
+        total = {"Id": "total", "Expression": "m0 + m599", "ReturnData": True}
+        queries[0]["ReturnData"] = False
+        queries[599]["ReturnData"] = False
+
+        self.cw.get_metrics([*queries, total], START, START + datetime.timedelta(minutes=5))
+
+        batches = [[query["Id"] for query in call["MetricDataQueries"]] for call in self.fake.calls]
+        self.assertTrue(all(len(batch) <= sajlib.aws.cloudwatch.GET_METRIC_DATA_MAX_QUERIES for batch in batches))
+        self.assertEqual(sorted(query_id for batch in batches for query_id in batch),
+                         sorted(query["Id"] for query in [*queries, total]))
+        batch = next(batch for batch in batches if "total" in batch)
+        self.assertIn("m0", batch)
+        self.assertIn("m599", batch)
+
+    def test_metrics_function_rejected_across_batches(self):
+        queries = [self._query(f"m{i}") for i in range(600)]
+        total = {"Id": "total", "Expression": "SUM(METRICS())"}
+
+        with self.assertRaises(sajlib.aws.exceptions.ClientError):
+            self.cw.get_metrics([*queries, total], START, START + datetime.timedelta(minutes=5))
+
+        # Fits in a single call
+        series = self.cw.get_metrics([*queries[:499], total], START, START + datetime.timedelta(minutes=5))
+        self.assertEqual(len(self.fake.calls), 1)
+        self.assertIn("total", series)
+
+    def test_array_results_without_numpy(self):
+        with mock.patch.object(sajlib.aws.cloudwatch, "numpy", None):
+            series = self.cw.get_metrics([self._query("cpu")], START, START + datetime.timedelta(hours=1))["cpu"]
+
+        self.assertIsInstance(series.timestamps, array.array)
+        self.assertIsInstance(series.values, array.array)
+        self.assertEqual(series.values.typecode, "d")
+        self.assertEqual(series.timestamps[0], START.timestamp())
+
+    def test_numpy_results(self):
+        if sajlib.aws.cloudwatch.numpy is None:
+            self.skipTest("NumPy is not installed")
+        numpy = sajlib.aws.cloudwatch.numpy
+
+        series = self.cw.get_metrics([self._query("cpu")], START, START + datetime.timedelta(hours=1))["cpu"]
+
+        self.assertIsInstance(series.values, numpy.ndarray)
+        self.assertEqual(series.values.dtype, numpy.float64)
+        self.assertEqual(series.timestamps[0], START.timestamp())
+        self.assertEqual(series.values.tolist(), [float(minute) for minute in range(60)])
+
+
+if __name__ == '__main__':
+    unittest.main()
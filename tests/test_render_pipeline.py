@@ -0,0 +1,210 @@
+import os
+import tempfile
+import unittest
+from typing import Dict, List, Tuple
+
+import botocore.exceptions
+
+import sajlib.aws.exceptions
+from sajlib.util.render_pipeline import RenderPipeline
+
+
+class FakeParameterStore:
+    """
+    Stands in for ParameterStore. params maps full parameter name to (version, value)
+    """
+
+    def __init__(self, params: Dict[str, Tuple[int, str]]):
+        self.params = params
+        self.fail_describe = False
+        self.fail_fetch = False
+        self.describe_errors: List[Exception] = list()
+        self.fetched: List[List[str]] = list()
+
+    def retrieve_param_versions_by_path(self, param_path: str, recursive: bool) -> Dict[str, int]:
+        if self.fail_describe:
+            raise sajlib.aws.exceptions.ClientError("describe failed")
+        if self.describe_errors:
+            raise self.describe_errors.pop(0)
+        return {name: version for name, (version, _) in self.params.items()}
+
+    def retrieve_params(self, params: List[str], with_decryption: bool = False) -> Dict[str, str]:
+        if self.fail_fetch:
+            raise sajlib.aws.exceptions.ClientError("get failed")
+        self.fetched.append(list(params))
+        return {name: self.params[name][1] for name in params}
+
+    def update(self, name: str, value: str) -> None:
+        version, _ = self.params.get(name, (0, ""))
+        self.params[name] = (version + 1, value)
+
+
+class TestRenderPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+        self.ssm = FakeParameterStore({"/app/bind": (1, "0.0.0.0"), "/app/port": (1, "80")})
+        self.bind_template = self._write("bind.conf.j2", "bind={{ bind }}")
+        self.port_template = self._write("port.conf.j2", "port={{ port }}")
+
+        self.pipeline = RenderPipeline(param_path="/app/",
+                                       templates=[self.bind_template, self.port_template],
+                                       settle_seconds=5,
+                                       max_settle_seconds=30,
+                                       parameter_store=self.ssm)
+
+    def _write(self, name: str, content: str) -> str:
+        path = os.path.join(self._tmp.name, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    @staticmethod
+    def _read(path: str) -> str:
+        with open(path) as f:
+            return f.read()
+
+    def test_initial_render_waits_for_settle(self):
+        self.assertEqual(self.pipeline.step(now=0), [])
+        self.assertEqual(self.pipeline.pending, {self.bind_template, self.port_template})
+
+        written = self.pipeline.step(now=5)
+
+        self.assertEqual(written, [os.path.join(self._tmp.name, "bind.conf"),
+                                   os.path.join(self._tmp.name, "port.conf")])
+        self.assertEqual(self._read(os.path.join(self._tmp.name, "bind.conf")), "bind=0.0.0.0")
+        self.assertEqual(self._read(os.path.join(self._tmp.name, "port.conf")), "port=80")
+
+    def test_only_templates_referencing_changed_key_are_rendered(self):
+        self.pipeline.step(now=0)
+        self.pipeline.step(now=5)
+
+        self.ssm.update("/app/port", "8080")
+        self.pipeline.step(now=100)
+
+        self.assertEqual(self.pipeline.pending, {self.port_template})
+        self.assertEqual(self.pipeline.step(now=105), [os.path.join(self._tmp.name, "port.conf")])
+        self.assertEqual(self._read(os.path.join(self._tmp.name, "port.conf")), "port=8080")
+        # Only the changed param is fetched again
+        self.assertEqual(self.ssm.fetched[-1], ["/app/port"])
+
+    def test_burst_of_changes_renders_once(self):
+        self.pipeline.step(now=0)
+        self.pipeline.step(now=5)
+
+        for i, now in enumerate([100, 102, 104, 106]):
+            self.ssm.update("/app/port", str(9000 + i))
+            self.assertEqual(self.pipeline.step(now=now), [])
+
+        self.assertEqual(self.pipeline.step(now=111), [os.path.join(self._tmp.name, "port.conf")])
+        self.assertEqual(self._read(os.path.join(self._tmp.name, "port.conf")), "port=9003")
+        self.assertEqual(self.pipeline.step(now=200), [])
+
+    def test_max_settle_seconds_caps_wait(self):
+        self.pipeline.step(now=0)
+        self.pipeline.step(now=5)
+
+        written: List[str] = list()
+        for now in range(100, 140, 3):
+            self.ssm.update("/app/port", str(now))
+            written.extend(self.pipeline.step(now=now))
+
+        # Changes never settle for 5 seconds, but the first change at 100 is capped at 130
+        self.assertEqual(written, [os.path.join(self._tmp.name, "port.conf")])
+        self.assertEqual(self._read(os.path.join(self._tmp.name, "port.conf")), "port=130")
+
+    def test_failed_poll_keeps_pending_and_versions(self):
+        self.ssm.fail_describe = True
+        with self.assertRaises(sajlib.aws.exceptions.ClientError):
+            self.pipeline.step(now=0)
+
+        # Templates found before the failed poll must still be rendered once SSM is reachable
+        self.assertEqual(self.pipeline.pending, {self.bind_template, self.port_template})
+
+        self.ssm.fail_describe = False
+        self.ssm.fail_fetch = True
+        with self.assertRaises(sajlib.aws.exceptions.ClientError):
+            self.pipeline.step(now=1)
+
+        # Versions are not committed when values could not be fetched
+        self.ssm.fail_fetch = False
+        self.assertEqual(self.pipeline.poll(), {"bind", "port"})
+
+        self.assertEqual(len(self.pipeline.step(now=10)), 2)
+        self.assertEqual(self._read(os.path.join(self._tmp.name, "bind.conf")), "bind=0.0.0.0")
+
+    def test_included_template_change_is_rerendered(self):
+        self._write("macros.j2", "{{ bind }}")
+        layout = self._write("layout.conf.j2", "listen={% include 'macros.j2' %}")
+        pipeline = RenderPipeline(param_path="/app/",
+                                  templates=[layout],
+                                  settle_seconds=0,
+                                  parameter_store=self.ssm)
+
+        self.assertEqual(pipeline.step(now=0), [os.path.join(self._tmp.name, "layout.conf")])
+
+        macros = self._write("macros.j2", "{{ port }}")
+        os.utime(macros, (os.path.getmtime(macros) + 10, os.path.getmtime(macros) + 10))
+
+        self.assertEqual(pipeline.step(now=10), [os.path.join(self._tmp.name, "layout.conf")])
+        self.assertEqual(self._read(os.path.join(self._tmp.name, "layout.conf")), "listen=80")
+
+        # The include now references port, so port changes must re-render the layout
+        self.ssm.update("/app/port", "8080")
+        self.assertEqual(pipeline.step(now=20), [os.path.join(self._tmp.name, "layout.conf")])
+
+    def test_run_keeps_polling_after_connection_error(self):
+        self.ssm.describe_errors = [botocore.exceptions.EndpointConnectionError(endpoint_url="https://ssm")]
+        pipeline = RenderPipeline(param_path="/app/",
+                                  templates=[self.bind_template],
+                                  poll_interval=0,
+                                  settle_seconds=0,
+                                  parameter_store=self.ssm)
+
+        pipeline.run(max_iterations=2)
+
+        self.assertEqual(self.ssm.describe_errors, [])
+        self.assertEqual(self._read(os.path.join(self._tmp.name, "bind.conf")), "bind=0.0.0.0")
+
+    def test_failed_write_is_retried(self):
+        destination = os.path.join(self._tmp.name, "missing", "bind.conf")
+        pipeline = RenderPipeline(param_path="/app/",
+                                  templates={self.bind_template: destination, self.port_template: None},
+                                  settle_seconds=5,
+                                  parameter_store=self.ssm)
+
+        pipeline.step(now=0)
+        self.assertEqual(pipeline.step(now=5), [os.path.join(self._tmp.name, "port.conf")])
+        self.assertEqual(pipeline.pending, {self.bind_template})
+
+        os.mkdir(os.path.join(self._tmp.name, "missing"))
+
+        # Retried once settle_seconds have passed since the failed write
+        self.assertEqual(pipeline.step(now=6), [])
+        self.assertEqual(pipeline.step(now=10), [destination])
+        self.assertEqual(pipeline.pending, set())
+        self.assertEqual(self._read(destination), "bind=0.0.0.0")
+
+    def test_destination_never_overwrites_template(self):
+        template = self._write("app.conf", "bind={{ bind }}")
+        with self.assertRaises(ValueError):
+            RenderPipeline(param_path="/app/", templates=[template], parameter_store=self.ssm)
+        with self.assertRaises(ValueError):
+            RenderPipeline(param_path="/app/", templates={self.bind_template: self.bind_template},
+                           parameter_store=self.ssm)
+
+    def test_only_trailing_j2_is_stripped(self):
+        os.mkdir(os.path.join(self._tmp.name, "x.j2d"))
+        template = self._write(os.path.join("x.j2d", "app.conf.j2"), "bind={{ bind }}")
+        pipeline = RenderPipeline(param_path="/app/",
+                                  templates=[template],
+                                  settle_seconds=0,
+                                  parameter_store=self.ssm)
+
+        self.assertEqual(pipeline.step(now=0), [os.path.join(self._tmp.name, "x.j2d", "app.conf")])
+
+
+if __name__ == '__main__':
+    unittest.main()
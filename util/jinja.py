@@ -1,5 +1,5 @@
 import os
-from typing import Union, Dict, Any, Set
+from typing import Union, Dict, Any, Set, Tuple
 
 import logging
 
@@ -14,7 +14,7 @@ except ImportError as import_err:
 try:
     import jinja2.exceptions
     from jinja2 import Environment, FileSystemLoader, Template, DebugUndefined
-    from jinja2.meta import find_undeclared_variables
+    from jinja2.meta import find_undeclared_variables, find_referenced_templates
 except ImportError as import_err:
     LOG.error(f"Jinja2 is a required package: Please install it. {import_err}")
     raise import_err
@@ -68,6 +68,42 @@ class Jinja:
 
         return rendered_template
 
+    @staticmethod
+    def find_template_variables(template_file: str) -> Tuple[Set[str], Dict[str, float]]:
+        """
+        Finds every variable a template needs from the render context without rendering it.
+        Templates pulled in with include/import/extends that live in the same directory are followed as well
+        :param template_file: source file to read from
+        :return: set of variable names referenced by the template, e.g. {'bind', 'port'},
+                 and mapping of every file loaded to its mtime when it was read, e.g. {'/etc/app/app.conf.j2': 1.0}
+        """
+
+        base_path: str = os.path.dirname(os.path.abspath(template_file))
+        file_name: str = os.path.basename(template_file)
+
+        env: jinja2.environment = Environment(loader=FileSystemLoader(searchpath=base_path))
+
+        variables: Set[str] = set()
+        loaded_files: Dict[str, float] = dict()
+        seen: Set[str] = set()
+        pending = [file_name]
+
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+
+            source, file_path, _ = env.loader.get_source(env, name)
+            loaded_files[file_path] = os.path.getmtime(file_path)
+            abstract = env.parse(source)
+            variables |= find_undeclared_variables(abstract)
+
+            # Dynamic references (e.g. {% include some_var %}) are reported as None and can't be followed
+            pending.extend(ref for ref in find_referenced_templates(abstract) if ref is not None)
+
+        return variables, loaded_files
+
     @staticmethod
     def write_template_file(template_file: str,
                             render_variables: Dict[str, str],
@@ -111,6 +147,6 @@ class Jinja:
                 f.write(rendered)
         except OSError as err:
             ex_message = f"File Error: {err}"
-            raise ex_message
+            raise OSError(ex_message) from err
 
         return rendered_file_path
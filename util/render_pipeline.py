@@ -0,0 +1,282 @@
+import os
+import time
+import threading
+from typing import Union, Dict, List, Optional, Set
+
+import logging
+
+LOG = logging.getLogger(__name__)
+
+try:
+    from .jinja import Jinja
+    from ..aws import exceptions as aws_exceptions
+    from ..aws.parameter_store import ParameterStore
+except ImportError as import_err:
+    LOG.error(f"Unable to import module: {import_err}")
+    raise import_err
+
+try:
+    import botocore.exceptions
+    import jinja2.exceptions
+except ImportError as import_err:
+    LOG.error(f"Jinja2 and botocore are required packages: Please install them. {import_err}")
+    raise import_err
+
+# get_parameters() accepts at most 10 names per call
+GET_PARAMETERS_MAX_NAMES = 10
+
+
+class RenderPipeline:
+    """
+    Long-running ParameterStore to Jinja render pipeline.
+    Polls parameter versions under a path and only re-renders the templates that reference a changed parameter.
+    Changes arriving close together are coalesced so each affected template is written once per burst.
+
+    ex: pipeline = RenderPipeline(param_path="/devops/server/",
+                                  templates={"/etc/app/app.conf.j2": None, "/etc/app/env.j2": "/etc/default/app"})
+        pipeline.run()
+    """
+
+    def __init__(self,
+                 param_path: str,
+                 templates: Union[List[str], Dict[str, Optional[str]]],
+                 recursive: bool = True,
+                 with_decryption: bool = True,
+                 poll_interval: float = 60.0,
+                 settle_seconds: float = 5.0,
+                 max_settle_seconds: Optional[float] = 60.0,
+                 fail_on_undefined: bool = True,
+                 backup_original: bool = True,
+                 modification_message: str = "",
+                 region_name: str = "us-east-1",
+                 parameter_store: Optional[ParameterStore] = None):
+        """
+        :param param_path: Parameter Store path to watch, e.g. /devops/server/
+        :param templates: Template files to render. Either a list of templates, written to their path without .j2,
+                          or a mapping of template file to destination file (None for the default destination)
+                          Raises ValueError if a destination is the template itself
+        :param recursive: Include params in nested paths
+        :param with_decryption: Decrypt SecureString params
+        :param poll_interval: Seconds between polls while nothing is pending
+        :param settle_seconds: Seconds without further changes before pending templates are rendered
+        :param max_settle_seconds: Render pending templates after this many seconds even if changes keep arriving.
+                                   None waits for changes to settle no matter how long it takes
+        :param fail_on_undefined: Passed to Jinja.write_template_file()
+        :param backup_original: Passed to Jinja.write_template_file(). Only applies once the destination exists
+        :param modification_message: Passed to Jinja.write_template_file()
+        :param region_name: Region of the Parameter Store. Ignored when parameter_store is passed
+        :param parameter_store: Existing ParameterStore client to reuse
+        """
+        if not isinstance(templates, dict):
+            templates = {template: None for template in templates}
+
+        self._destinations: Dict[str, str] = dict()
+        for template, destination in templates.items():
+            destination = destination or (template[:-len('.j2')] if template.endswith('.j2') else template)
+            if os.path.abspath(destination) == os.path.abspath(template):
+                raise ValueError(f"Destination of template {template} would overwrite the template itself. "
+                                 f"Name the template *.j2 or pass a destination file")
+            self._destinations[template] = destination
+
+        self._ssm: ParameterStore = parameter_store or ParameterStore(region_name=region_name)
+        self.param_path: str = param_path
+        self.recursive: bool = recursive
+        self.with_decryption: bool = with_decryption
+        self.poll_interval: float = poll_interval
+        self.settle_seconds: float = settle_seconds
+        self.max_settle_seconds: Optional[float] = max_settle_seconds
+        self.fail_on_undefined: bool = fail_on_undefined
+        self.backup_original: bool = backup_original
+        self.modification_message: str = modification_message
+
+        # Full parameter name -> version/value last seen
+        self._versions: Dict[str, int] = dict()
+        self._params: Dict[str, str] = dict()
+
+        # Template file -> trimmed variable names it references, and every file it loaded with the mtime it was read at
+        self._template_variables: Dict[str, Set[str]] = dict()
+        self._template_files: Dict[str, Dict[str, float]] = dict()
+
+        self._pending: Set[str] = set()
+        self._first_change: Optional[float] = None
+        self._last_change: Optional[float] = None
+        self._stop = threading.Event()
+
+    @property
+    def pending(self) -> Set[str]:
+        """
+        Templates waiting for changes to settle before they are rendered
+        """
+        return set(self._pending)
+
+    def poll(self) -> Set[str]:
+        """
+        Compares current parameter versions against the last seen versions and fetches values for new or updated
+        params only. Deleted params are dropped.
+        :return: Trimmed names of every param that was added, updated or deleted since the last poll
+        """
+        versions: Dict[str, int] = self._ssm.retrieve_param_versions_by_path(param_path=self.param_path,
+                                                                             recursive=self.recursive)
+
+        changed: List[str] = [name for name, version in versions.items() if self._versions.get(name) != version]
+        removed: Set[str] = set(self._versions) - set(versions)
+
+        fetched: Dict[str, str] = dict()
+        for i in range(0, len(changed), GET_PARAMETERS_MAX_NAMES):
+            fetched.update(self._ssm.retrieve_params(params=changed[i:i + GET_PARAMETERS_MAX_NAMES],
+                                                     with_decryption=self.with_decryption))
+
+        # Only commit state once every value was fetched, a failed poll is retried in full next time
+        self._params.update(fetched)
+        for name in removed:
+            self._params.pop(name, None)
+        self._versions = versions
+
+        if changed or removed:
+            LOG.info(f"{len(changed)} param(s) changed and {len(removed)} removed under {self.param_path}")
+
+        return set(ParameterStore.trim_param_keys({name: "" for name in [*changed, *removed]}))
+
+    def step(self, now: Optional[float] = None) -> List[str]:
+        """
+        Runs a single poll, marks affected templates as pending and renders them once changes have settled
+        :param now: Current time.monotonic() value. Mostly useful for testing
+        :return: Destination files written during this step
+        """
+        now = time.monotonic() if now is None else now
+
+        # Mark modified templates before polling so they stay pending if the poll fails
+        self._mark_pending(self._refresh_templates(), now)
+
+        changed_keys: Set[str] = self.poll()
+        if changed_keys:
+            self._mark_pending({template for template, variables in self._template_variables.items()
+                                if variables & changed_keys}, now)
+
+        if self._pending and self._is_settled(now):
+            return self.render_pending(now=now)
+
+        return []
+
+    def render_pending(self, now: Optional[float] = None) -> List[str]:
+        """
+        Renders and writes every pending template with the latest parameter values
+        A template that fails to render is logged and skipped until one of its inputs changes again.
+        A template that fails to be written stays pending and is retried once settle_seconds have passed
+        :param now: Current time.monotonic() value. Mostly useful for testing
+        :return: Destination files written
+        """
+        now = time.monotonic() if now is None else now
+        render_variables: Dict[str, str] = ParameterStore.trim_param_keys(self._params)
+        written: List[str] = list()
+        failed_writes: Set[str] = set()
+
+        for template in sorted(self._pending):
+            destination = self._destinations[template]
+            try:
+                written.append(Jinja.write_template_file(template_file=template,
+                                                         render_variables=render_variables,
+                                                         destination_file=destination,
+                                                         fail_on_undefined=self.fail_on_undefined,
+                                                         backup_original=self.backup_original and
+                                                         os.path.isfile(destination),
+                                                         modification_message=self.modification_message))
+            except jinja2.exceptions.TemplateError as err:
+                LOG.error(f"Unable to render {template}: {err}")
+            except OSError as err:
+                LOG.error(f"Unable to write {template} to {destination}, will retry: {err}")
+                failed_writes.add(template)
+
+        if written:
+            LOG.info(f"Rendered {len(written)} template(s): {written}")
+
+        self._pending.clear()
+        self._first_change = None
+        self._last_change = None
+        self._mark_pending(failed_writes, now)
+
+        return written
+
+    def run(self, max_iterations: Optional[int] = None) -> None:
+        """
+        Polls until stop() is called. Parameter Store and connection errors are logged and retried on the next poll
+        :param max_iterations: Stop after this many polls. None runs forever
+        """
+        self._stop.clear()
+        iterations = 0
+
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except (aws_exceptions.ClientError, botocore.exceptions.BotoCoreError) as err:
+                LOG.error(f"Unable to poll Parameter Store path {self.param_path}: {err}")
+
+            iterations += 1
+            if max_iterations is not None and iterations >= max_iterations:
+                break
+
+            self._stop.wait(self._next_wait(time.monotonic()))
+
+    def stop(self) -> None:
+        """
+        Signals run() to return after the current poll
+        """
+        self._stop.set()
+
+    def _refresh_templates(self) -> Set[str]:
+        """
+        Re-reads the referenced variables of any template that is new or has a modified or deleted file
+        among the ones it loaded (itself and any included, imported or extended template)
+        :return: Templates that are new or were modified
+        """
+        modified: Set[str] = set()
+
+        for template in self._destinations:
+            if template in self._template_files and not self._files_modified(self._template_files[template]):
+                continue
+
+            try:
+                variables, loaded_files = Jinja.find_template_variables(template)
+            except (jinja2.exceptions.TemplateError, OSError) as err:
+                LOG.error(f"Unable to parse template {template}: {err}")
+                continue
+
+            self._template_variables[template] = variables
+            self._template_files[template] = loaded_files
+            modified.add(template)
+
+        return modified
+
+    @staticmethod
+    def _files_modified(loaded_files: Dict[str, float]) -> bool:
+        for file_path, mtime in loaded_files.items():
+            try:
+                if os.path.getmtime(file_path) != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _mark_pending(self, templates: Set[str], now: float) -> None:
+        if not templates:
+            return
+
+        self._pending |= templates
+        self._last_change = now
+        if self._first_change is None:
+            self._first_change = now
+
+    def _is_settled(self, now: float) -> bool:
+        if now - self._last_change >= self.settle_seconds:
+            return True
+        return self.max_settle_seconds is not None and now - self._first_change >= self.max_settle_seconds
+
+    def _next_wait(self, now: float) -> float:
+        if not self._pending:
+            return self.poll_interval
+
+        deadline = self._last_change + self.settle_seconds
+        if self.max_settle_seconds is not None:
+            deadline = min(deadline, self._first_change + self.max_settle_seconds)
+
+        return min(self.poll_interval, max(0.0, deadline - now))